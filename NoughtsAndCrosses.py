@@ -16,12 +16,29 @@ Intent schema:
         }
       ]
     },
+    {
+      "intent": "SelectMode",
+      "slots": [
+        {
+          "name": "Mode",
+          "type": "LIST_OF_MODES"
+        }
+      ]
+    },
     {
       "intent": "PlayerMove",
       "slots": [
         {
           "name": "Move",
           "type": "LIST_OF_MOVES"
+        },
+        {
+          "name": "Board",
+          "type": "LIST_OF_MOVES"
+        },
+        {
+          "name": "Level",
+          "type": "AMAZON.NUMBER"
         }
       ]
     },
@@ -31,6 +48,14 @@ Intent schema:
         {
           "name": "Square",
           "type": "LIST_OF_MOVES"
+        },
+        {
+          "name": "Board",
+          "type": "LIST_OF_MOVES"
+        },
+        {
+          "name": "Level",
+          "type": "AMAZON.NUMBER"
         }
       ]
     },
@@ -39,6 +64,7 @@ Intent schema:
       "slots": []
     },
     {"intent": "AMAZON.StartOverIntent"},
+    {"intent": "AMAZON.RepeatIntent"},
     {"intent": "AMAZON.HelpIntent"},
     {"intent": "AMAZON.YesIntent"},
     {"intent": "AMAZON.NoIntent"},
@@ -57,12 +83,24 @@ B3
 C1
 C2
 C3
+A4
+B4
+C4
+D1
+D2
+D3
+D4
 
 LIST_OF_DIFFICULTIES slot values:
 easy
 medium
 hard
 
+LIST_OF_MODES slot values:
+classic
+ultimate
+cube
+
 Sample utterances:
 SelectDifficulty {Difficulty}
 SelectDifficulty Make it {Difficulty}
@@ -70,16 +108,32 @@ SelectDifficulty I want {Difficulty}
 SelectDifficulty Let's play {Difficulty}
 SelectDifficulty {Difficulty} please
 
+SelectMode Play {Mode}
+SelectMode Let's play {Mode}
+SelectMode I want to play {Mode}
+SelectMode {Mode} mode
+SelectMode {Mode} game
+
 PlayerMove {Move}
 PlayerMove {Move} please
 PlayerMove My move is {Move}
 PlayerMove Mark {Move}
+PlayerMove {Board} {Move}
+PlayerMove Board {Board} square {Move}
+PlayerMove Square {Move} on board {Board}
+PlayerMove {Move} on level {Level}
+PlayerMove {Move} level {Level}
+PlayerMove Level {Level} {Move}
 
 CheckSquare Check {Square}
 CheckSquare Check square {Square}
 CheckSquare Check position {Square}
 CheckSquare What is on {Square}
 CheckSquare Tell me what is on {Square}
+CheckSquare Check {Board} {Square}
+CheckSquare Check square {Square} on board {Board}
+CheckSquare Check {Square} on level {Level}
+CheckSquare Check square {Square} on level {Level}
 
 CheckBoard How does the board look like
 CheckBoard What is on the board
@@ -109,8 +163,12 @@ AMAZON.YesIntent go ahead
 from __future__ import print_function
 from random import randint
 from random import choice
+from random import shuffle
+from collections import OrderedDict
 import copy
+import json
 import re
+import time
 
 # states
 STATE_SELECTING_DIFFICULTY = 1
@@ -118,6 +176,43 @@ STATE_SELECTING_FIRST = 2
 STATE_PLAYING = 3
 STATE_FINISHED = 4
 
+# game modes
+MODE_CLASSIC = "classic"
+MODE_ULTIMATE = "ultimate"
+MODE_CUBE = "cube"
+
+# all lines of 3 on a single 3 by 3 board
+WINNING_LINES = [[7,8,9], [4,5,6], [1,2,3], [7,4,1], [8,5,2], [9,6,3], [7,5,3], [9,5,1]]
+
+# chance (in %) that the computer makes a random move instead of its best one, for every difficulty
+# (SelfPlay.py can fit these to the win rates we want players to have, it only plays the classic game)
+RANDOM_MOVE_CHANCE = {"easy": 100, "medium": 40, "hard": 0}
+# the same for the ultimate and cube modes, which are not tuned by SelfPlay.py
+LARGE_BOARD_RANDOM_MOVE_CHANCE = {"easy": 100, "medium": 40, "hard": 0}
+
+# groups of squares the computer prefers when it can neither win nor has to block, best group first
+COMPUTER_MOVE_PREFERENCES = [[1, 3, 7, 9], [5], [2, 4, 6, 8]]
+
+# time (in seconds) the computer may spend searching for a move in the ultimate mode
+ULTIMATE_TIME_LIMIT = 1.0
+ULTIMATE_WIN_SCORE = 1000000
+
+# squares on the 3 by 3 board, also used to name the sub-boards in the ultimate mode
+CLASSIC_FIELDS = ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]
+
+# squares on a single level of the 4 by 4 by 4 cube, levels are numbered 1 to 4
+CUBE_FIELDS = ["A1", "A2", "A3", "A4", "B1", "B2", "B3", "B4", "C1", "C2", "C3", "C4", "D1", "D2", "D3", "D4"]
+
+# time (in seconds) the computer may spend searching for a move in the cube mode
+CUBE_TIME_LIMIT = 1.0
+# how many forcing moves ahead the cube mode search may look for a forced win
+CUBE_MAX_THREAT_DEPTH = 12
+# positions remembered by the cube mode search before the cache is cleared
+CUBE_CACHE_SIZE = 100000
+
+# responses remembered for retried and repeated requests before the oldest ones are dropped
+RESPONSE_CACHE_SIZE = 1000
+
 # --------------- Helpers that build all the responses ----------------------
 def build_speechlet_response(title, output, reprompt_text, should_end_session, cardOutput=""):
     # remove SSML tags for card output
@@ -164,7 +259,7 @@ def welcome_response(attributes):
     card_title = "Welcome to Noughts and Crosses"
     attributes["lastOutput"] = "Please select difficulty: easy, medium or hard. "
     attributes["lastRepeat"] = "Please select difficulty: easy, medium or hard. "
-    speech_output = "Welcome to Noughts and Crosses! " + attributes["lastOutput"]
+    speech_output = "Welcome to Noughts and Crosses! If you want to play on a board made of 9 boards, say play ultimate. To play on a 4 by 4 by 4 cube, say play cube. " + attributes["lastOutput"]
     reprompt_text = attributes["lastRepeat"] 
     should_end_session = False
     session_attributes = build_session_attributes(attributes)
@@ -193,12 +288,26 @@ def handle_session_end_request():
 
 def handle_help_request(attributes):
     card_title = "Help"
-    speech_output = "Noughts and crosses is a game played on a 3 by 3 square board, on which two players place noughts and crosses in turns. " \
+    if attributes.get("mode") == MODE_ULTIMATE:
+        speech_output = "Ultimate noughts and crosses is played on a board made of 9 small 3 by 3 boards, on which two players place noughts and crosses in turns. " \
+                    "Rows are marked: A, B and C, and columns: 1, 2 and 3, both for the boards and for the squares on them. "\
+                    "Whoever places 3 of the same marks in a line on a small board, claims that board, and whoever first claims 3 boards in a line, wins. "\
+                    "The square you choose decides on which board your opponent has to play next. "\
+                    "If that board is already finished, your opponent can play on any open board. "\
+                    "During your turn, you say the board followed by the square, for example B2 A1, or just the square if the board is decided. \n\n"
+    elif attributes.get("mode") == MODE_CUBE:
+        speech_output = "Cube noughts and crosses is played on a cube made of 4 levels, each of them a 4 by 4 board, on which two players place noughts and crosses in turns. " \
+                    "Whoever first places 4 of the same marks in a line, wins. Lines can also go across the levels. "\
+                    "Rows are marked: A, B, C and D, columns: 1, 2, 3 and 4, and levels are numbered from 1 to 4. "\
+                    "During your turn, you say the square followed by the level, for example B3 on level 2. \n\n"
+    else:
+        speech_output = "Noughts and crosses is a game played on a 3 by 3 square board, on which two players place noughts and crosses in turns. " \
                     "Whoever first places 3 of the same marks in a line, wins. Rows are marked: A, B and C, and columns: 1, 2 and 3. "\
-                    "During your turn, you say in which square you want to place your mark, for example A2 or C3. \n\n"\
-                    "You can also ask to check what is already in a given square by saying check square, "\
+                    "During your turn, you say in which square you want to place your mark, for example A2 or C3. \n\n"
+    speech_output += "You can also ask to check what is already in a given square by saying check square, "\
                     "check what\'s on the entire board by saying check board, restart the game or quit. " \
-                    "<break time=\"1.5s\"/> \n\n" + attributes["lastRepeat"]
+                    "<break time=\"1.5s\"/> \n\n"
+    speech_output += attributes["lastRepeat"]
     reprompt_text = attributes["lastRepeat"]
     should_end_session = False
     session_attributes = build_session_attributes(attributes)
@@ -251,7 +360,364 @@ def say_message(cardName, message, repeat, attributes, cardMessage, changeLast =
 
 def select_random_response(responses):
     return responses[randint(0,len(responses) - 1)]
+
+# ----------------------- Ultimate mode responses
+# ---------------------------------------------------
+def get_field_slot(intent, slotName, fields = CLASSIC_FIELDS):
+    # return the upper-cased slot value if it is one of the fields, "" if the slot is empty, otherwise None
+    if slotName in intent['slots'].keys() and 'value' in intent['slots'][slotName].keys():
+        field = intent['slots'][slotName]['value'].upper()
+        if field in fields:
+            return field
+        return None
+    return ""
+
+def ultimate_move_prompt(attributes):
+    # tells the player where the next move has to be made
+    if attributes["nextBoard"]:
+        return "You play on board " + convertBoardNumberToField(attributes["nextBoard"]) + ". Which square do you choose? "
+    return "You can play on any open board. Say the board followed by the square, for example B2 A1. "
+
+def ultimate_finished_message(attributes, cardName, message):
+    attributes["state"] = STATE_FINISHED
+    return say_message(cardName,
+        message + " <break time=\"1s\"/>Do you want to play again? ",
+        "Do you want to play again? ",
+        attributes,
+        message + " Do you want to play again? \n\n" + \
+        drawUltimateBoard(attributes["board"]))
+
+def handle_ultimate_start(attributes, playerStarts):
+    if playerStarts:
+        return say_message("Your move",
+            "You start. " + ultimate_move_prompt(attributes),
+            ultimate_move_prompt(attributes),
+            attributes,
+            "You start. " + ultimate_move_prompt(attributes) + "\n\n" + \
+            drawUltimateBoard(attributes["board"]))
+
+    computerMove = getAlexaUltimateMove(attributes)
+    attributes["nextBoard"] = makeUltimateMove(attributes["board"], attributes["macroBoard"], attributes["computer"], computerMove)
+    msg = "I start and place a " + convertLetterToWord(attributes["computer"]) + " in " + convertUltimateMoveToField(computerMove) + ". "
+    return say_message("Your move",
+        msg + ultimate_move_prompt(attributes),
+        ultimate_move_prompt(attributes),
+        attributes,
+        msg + ultimate_move_prompt(attributes) + "\n\n" + \
+        drawUltimateBoard(attributes["board"]))
+
+def handle_ultimate_move(intent, attributes):
+    board = attributes["board"]
+    macroBoard = attributes["macroBoard"]
+
+    # get player's move
+    move = get_field_slot(intent, 'Move')
+    boardField = get_field_slot(intent, 'Board')
+    if not move:
+        return say_message("Invalid move",
+            ("I did not hear the square. " if move == "" else "This is not a valid square. ") + ultimate_move_prompt(attributes),
+            ultimate_move_prompt(attributes),
+            attributes,
+            ultimate_move_prompt(attributes) + "\n\n" + drawUltimateBoard(board))
+
+    if attributes["nextBoard"]:
+        subBoard = attributes["nextBoard"]
+        if boardField is None:
+            return say_message("Invalid board",
+                "This is not a valid board. " + ultimate_move_prompt(attributes),
+                ultimate_move_prompt(attributes),
+                attributes,
+                "This is not a valid board. " + ultimate_move_prompt(attributes) + "\n\n" + \
+                drawUltimateBoard(board))
+        elif boardField and convertFieldToBoardNumber(boardField) != subBoard:
+            return say_message("Invalid board",
+                "You cannot play on board " + boardField + " now. " + ultimate_move_prompt(attributes),
+                ultimate_move_prompt(attributes),
+                attributes,
+                "You cannot play on board " + boardField + " now. " + ultimate_move_prompt(attributes) + "\n\n" + \
+                drawUltimateBoard(board))
+    else:
+        if not boardField:
+            return say_message("Invalid board",
+                "Which board do you want to play on? " + ultimate_move_prompt(attributes),
+                ultimate_move_prompt(attributes),
+                attributes,
+                ultimate_move_prompt(attributes) + "\n\n" + drawUltimateBoard(board))
+        subBoard = convertFieldToBoardNumber(boardField)
+        if macroBoard[subBoard] != ' ':
+            return say_message("Invalid board",
+                "Board " + boardField + " is already finished. " + ultimate_move_prompt(attributes),
+                ultimate_move_prompt(attributes),
+                attributes,
+                "Board " + boardField + " is already finished. " + ultimate_move_prompt(attributes) + "\n\n" + \
+                drawUltimateBoard(board))
+
+    playerMove = (subBoard, convertFieldToBoardNumber(move))
+
+    # check if space already occupied
+    if not isSpaceFree(board[subBoard], playerMove[1]):
+        msg = convertUltimateMoveToField(playerMove) + " is already occupied by a " + convertLetterToWord(board[subBoard][playerMove[1]]) + ". "
+        return say_message("Your move",
+            msg + ultimate_move_prompt(attributes),
+            ultimate_move_prompt(attributes),
+            attributes,
+            msg + ultimate_move_prompt(attributes) + "\n\n" + drawUltimateBoard(board))
+
+    # update the board with player's move
+    attributes["nextBoard"] = makeUltimateMove(board, macroBoard, attributes["player"], playerMove)
+
+    # check if player won
+    winner = getUltimateWinner(macroBoard)
+    if winner == attributes["player"]:
+        return ultimate_finished_message(attributes, "You win!", "Congratulations, you win!")
+    elif winner == 'D':
+        return ultimate_finished_message(attributes, "It's a draw!", "It's a draw, nobody won!")
+
+    # get computer's move
+    computerMove = getAlexaUltimateMove(attributes)
+    attributes["nextBoard"] = makeUltimateMove(board, macroBoard, attributes["computer"], computerMove)
+
+    # check if computer won
+    winner = getUltimateWinner(macroBoard)
+    if winner == attributes["computer"]:
+        return ultimate_finished_message(attributes, "You lose!", "I win, you lose! Thank you for the good game.")
+    elif winner == 'D':
+        return ultimate_finished_message(attributes, "It's a draw!", "It's a draw, nobody won!")
+
+    # game not finished yet - prompt next move
+    msg = "You place a " + convertLetterToWord(attributes["player"]) + " in " + convertUltimateMoveToField(playerMove) + ". " \
+        "I place a " + convertLetterToWord(attributes["computer"]) + " in " + convertUltimateMoveToField(computerMove) + ". "
+    return say_message("Your move",
+        msg + ultimate_move_prompt(attributes),
+        ultimate_move_prompt(attributes),
+        attributes,
+        msg + ultimate_move_prompt(attributes) + "\n\n" + drawUltimateBoard(board))
+
+def handle_ultimate_check_square(intent, attributes):
+    move = get_field_slot(intent, 'Square')
+    boardField = get_field_slot(intent, 'Board')
+    if not boardField and boardField is not None and attributes["nextBoard"]:
+        # without a board, check the square on the board the player has to play on
+        boardField = convertBoardNumberToField(attributes["nextBoard"])
+
+    if not move or not boardField:
+        return say_message("Invalid square",
+            "Please say the board followed by the square to check, for example check B2 A1. <break time=\"0.7s\"/> \n\n" \
+            + attributes["lastRepeat"],
+            attributes["lastRepeat"],
+            attributes,
+            "Please say the board followed by the square to check, for example check B2 A1. \n" \
+            + attributes["lastRepeat"] + "\n\n" + \
+            drawUltimateBoard(attributes["board"]),
+            False)
+
+    checked = (convertFieldToBoardNumber(boardField), convertFieldToBoardNumber(move))
+    content = convertLetterToWord(getSpaceContent(attributes["board"][checked[0]], checked[1]))
+    if content in ["cross","nought"]:
+        content = "a " + content
+    return say_message("Square Content",
+        convertUltimateMoveToField(checked) + " is " + content + ". <break time=\"0.7s\"/> \n\n" \
+        + attributes["lastRepeat"],
+        attributes["lastRepeat"],
+        attributes,
+        convertUltimateMoveToField(checked) + " is " + content + ".\n" + \
+        attributes["lastRepeat"] + "\n\n" + \
+        drawUltimateBoard(attributes["board"]),
+        False)
+
+def handle_ultimate_check_board(attributes):
+    content = sayUltimateBoard(attributes["board"], attributes["macroBoard"], attributes["nextBoard"])
+    return say_message("Board Content",
+        content + " <break time=\"1.0s\"/> " \
+        + attributes["lastRepeat"],
+        attributes["lastRepeat"],
+        attributes,
+        drawUltimateBoard(attributes["board"]) + "\n\n" + attributes["lastRepeat"],
+        False)
+
+# ----------------------- Cube mode responses
+# ---------------------------------------------------
+def get_level_slot(intent):
+    # return the level number from the slot, 0 if the slot is empty, otherwise None
+    if 'Level' in intent['slots'].keys() and 'value' in intent['slots']['Level'].keys():
+        level = intent['slots']['Level']['value']
+        if level in ["1", "2", "3", "4"]:
+            return int(level)
+        return None
+    return 0
+
+def cube_finished_message(attributes, cardName, message):
+    attributes["state"] = STATE_FINISHED
+    return say_message(cardName,
+        message + " <break time=\"1s\"/>Do you want to play again? ",
+        "Do you want to play again? ",
+        attributes,
+        message + " Do you want to play again? \n\n" + \
+        drawCubeBoard(attributes["board"]))
+
+def handle_cube_start(attributes, playerStarts):
+    if playerStarts:
+        return say_message("Your move",
+            "You start. What is your first move?",
+            "What is your move? Say the square followed by the level, for example B3 on level 2. ",
+            attributes,
+            "You start. What is your first move? \n\n" + \
+            drawCubeBoard(attributes["board"]))
+
+    computerMove = getAlexaCubeMove(attributes)
+    makeMove(attributes["board"], attributes["computer"], computerMove)
+    msg = "I start and place a " + convertLetterToWord(attributes["computer"]) + " in " + convertCubeNumberToField(computerMove) + ". "
+    return say_message("Your move",
+        msg + "What is your move?",
+        "What is your move? Say the square followed by the level, for example B3 on level 2. ",
+        attributes,
+        msg + "What is your move? \n\n" + \
+        drawCubeBoard(attributes["board"]))
+
+def handle_cube_move(intent, attributes):
+    board = attributes["board"]
+
+    # get player's move
+    move = get_field_slot(intent, 'Move', CUBE_FIELDS)
+    level = get_level_slot(intent)
+    if not move or not level:
+        return say_message("Invalid move",
+            "This is not a valid square. Please say the square followed by the level, for example B3 on level 2. What is your move?",
+            "What is your move? Say the square followed by the level, for example B3 on level 2. ",
+            attributes,
+            "Please select another square. What is your move? \n\n" + \
+            drawCubeBoard(board))
+
+    playerMove = convertCubeFieldToBoardNumber(move, level)
+
+    # check if space already occupied
+    if not isSpaceFree(board, playerMove):
+        msg = convertCubeNumberToField(playerMove) + " is already occupied by a " + convertLetterToWord(board[playerMove]) + ". "
+        return say_message("Your move",
+            msg + "Please select another square. What is your move?",
+            "What is your move? Say the square followed by the level, for example B3 on level 2. ",
+            attributes,
+            msg + "Please select another square. What is your move? \n\n" + \
+            drawCubeBoard(board))
+
+    # update the board with player's move
+    makeMove(board, attributes["player"], playerMove)
+
+    # check if player won
+    if isCubeWinner(board, attributes["player"], playerMove):
+        return cube_finished_message(attributes, "You win!", "Congratulations, you win!")
+    elif ' ' not in board[1:]:
+        return cube_finished_message(attributes, "It's a draw!", "It's a draw, nobody won!")
+
+    # get computer's move
+    computerMove = getAlexaCubeMove(attributes)
+    makeMove(board, attributes["computer"], computerMove)
+
+    # check if computer won
+    if isCubeWinner(board, attributes["computer"], computerMove):
+        return cube_finished_message(attributes, "You lose!", "I win, you lose! Thank you for the good game.")
+    elif ' ' not in board[1:]:
+        return cube_finished_message(attributes, "It's a draw!", "It's a draw, nobody won!")
+
+    # game not finished yet - prompt next move
+    msg = "You place a " + convertLetterToWord(attributes["player"]) + " in " + convertCubeNumberToField(playerMove) + ". " \
+        "I place a " + convertLetterToWord(attributes["computer"]) + " in " + convertCubeNumberToField(computerMove) + ". "
+    return say_message("Your move",
+        msg + "What is your next move?",
+        "What is your move? Say the square followed by the level, for example B3 on level 2. ",
+        attributes,
+        msg + "What is your next move? \n\n" + drawCubeBoard(board))
+
+def handle_cube_check_square(intent, attributes):
+    move = get_field_slot(intent, 'Square', CUBE_FIELDS)
+    level = get_level_slot(intent)
+
+    if not move or not level:
+        return say_message("Invalid square",
+            "Please say the square followed by the level to check, for example check B3 on level 2. <break time=\"0.7s\"/> \n\n" \
+            + attributes["lastRepeat"],
+            attributes["lastRepeat"],
+            attributes,
+            "Please say the square followed by the level to check, for example check B3 on level 2. \n" \
+            + attributes["lastRepeat"] + "\n\n" + \
+            drawCubeBoard(attributes["board"]),
+            False)
+
+    checked = convertCubeFieldToBoardNumber(move, level)
+    content = convertLetterToWord(getSpaceContent(attributes["board"], checked))
+    if content in ["cross","nought"]:
+        content = "a " + content
+    return say_message("Square Content",
+        convertCubeNumberToField(checked) + " is " + content + ". <break time=\"0.7s\"/> \n\n" \
+        + attributes["lastRepeat"],
+        attributes["lastRepeat"],
+        attributes,
+        convertCubeNumberToField(checked) + " is " + content + ".\n" + \
+        attributes["lastRepeat"] + "\n\n" + \
+        drawCubeBoard(attributes["board"]),
+        False)
+
+def handle_cube_check_board(attributes):
+    content = sayCubeBoard(attributes["board"])
+    return say_message("Board Content",
+        content + " <break time=\"1.0s\"/> " \
+        + attributes["lastRepeat"],
+        attributes["lastRepeat"],
+        attributes,
+        drawCubeBoard(attributes["board"]) + "\n\n" + attributes["lastRepeat"],
+        False)
    
+# ----------------------- Response cache
+# ---------------------------------------------------
+# responses kept for as long as the lambda container lives, as (sessionId, response) by key:
+#   ('request', requestId) - for requests retried by Alexa
+#   ('intent', sessionId, state, intent) - for the same intent sent again in the same game state,
+#       which includes the request count, so a response from an earlier game is never replayed
+#   ('last', sessionId) - the last response in the session, replayed by the repeat intent
+responseCache = OrderedDict()
+
+def get_intent_cache_key(intent_request, session):
+    state = json.dumps(session.get('attributes') or {}, sort_keys=True)
+    return ('intent', session['sessionId'], state, json.dumps(intent_request['intent'], sort_keys=True))
+
+def get_cached_response(key):
+    if key in responseCache:
+        return responseCache[key][1]
+    return None
+
+def cache_response(keys, sessionId, response):
+    # remember the response under all keys, dropping the oldest responses once the cache is full
+    for key in keys:
+        responseCache.pop(key, None)
+        responseCache[key] = (sessionId, response)
+    while len(responseCache) > RESPONSE_CACHE_SIZE:
+        responseCache.popitem(last=False)
+
+    # no more requests will come in a session which has ended, only the retries of this one
+    if response['response']['shouldEndSession']:
+        expire_cached_responses(sessionId, keys[0])
+
+def expire_cached_responses(sessionId, keep=None):
+    for key in [k for k in responseCache if responseCache[k][0] == sessionId and k != keep]:
+        del responseCache[key]
+
+def handle_repeat_request(session, attributes):
+    # the last response cached here is only the last one of the session if another lambda container
+    # has not answered since, i.e. if it left the request count the session comes back with
+    # (on_intent has already counted this request)
+    response = get_cached_response(('last', session['sessionId']))
+    if response and response['sessionAttributes'].get("requestCount") == attributes["requestCount"] - 1:
+        return response
+    # the last response was sent from another lambda container, so say the last message again
+    if not attributes["lastOutput"]:
+        return welcome_response(attributes)
+    return say_message("Repeat",
+        attributes["lastOutput"],
+        attributes["lastRepeat"],
+        attributes,
+        "",
+        False)
+
 # ----------------------- Events
 # ---------------------------------------------------
 def on_session_started(session_started_request, session):
@@ -275,11 +741,16 @@ def on_launch(launch_request, session):
     return welcome_response(attributes)
 
 # if the skill gets into the wrong state, set a meaningful re-prompt
-def set_wrong_state_reprompt(state):
+def set_wrong_state_reprompt(attributes):
+    state = attributes['state']
     if state == STATE_SELECTING_DIFFICULTY:
         msg = "Please select difficulty: easy, medium or hard. "
     elif state == STATE_SELECTING_FIRST:
         msg = "Who should go first, do you want to make the first move? Say yes or no. "
+    elif state == STATE_PLAYING and attributes.get("mode") == MODE_ULTIMATE:
+        msg = ultimate_move_prompt(attributes)
+    elif state == STATE_PLAYING and attributes.get("mode") == MODE_CUBE:
+        msg = "What is your move? Say the square followed by the level, for example B3 on level 2. "
     elif state == STATE_PLAYING:
         msg = "What is your move? Say row followed by column, for example A1. "
     else:
@@ -301,6 +772,10 @@ def on_intent(intent_request, session):
     else:
         attributes = session['attributes']
 
+    # count the requests, so that the game state never repeats within a session and a cached response
+    # can only be replayed for the same request sent again (see get_intent_cache_key)
+    attributes["requestCount"] = attributes.get("requestCount", 0) + 1
+
     intent = intent_request['intent']
     intent_name = intent_request['intent']['name']
 
@@ -338,19 +813,58 @@ def on_intent(intent_request, session):
                 "")
         else:
             if not attributes["lastRepeat"]:
-                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes['state'])
+                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes)
+            return handle_wrong_state(attributes);
+
+    # "select mode" intent - switches between the classic, the ultimate and the cube game before the difficulty is chosen
+    elif intent_name == "SelectMode":
+        if attributes['state'] == STATE_SELECTING_DIFFICULTY:
+
+            valid = False
+            mode = ""
+            if 'Mode' in intent['slots'].keys() and 'value' in intent['slots']['Mode'].keys():
+                mode = intent['slots']['Mode']['value'].lower()
+                if mode in [MODE_CLASSIC, MODE_ULTIMATE, MODE_CUBE]:
+                    valid = True
+
+            if not valid:
+                if not mode:
+                    mode = "This"
+                msg = mode + " is not a valid game mode. " \
+                    "Say play classic, play ultimate or play cube. Or select difficulty: easy, medium or hard."
+                return say_message("Invalid game mode",
+                    msg,
+                    "Please select difficulty: easy, medium or hard. ",
+                    attributes,
+                    msg)
+
+            attributes["mode"] = mode
+            clearBoard(attributes)
+
+            return say_message("Select difficulty",
+                "Game mode set to " + mode + ". Please select difficulty: easy, medium or hard. ",
+                "Please select difficulty: easy, medium or hard. ",
+                attributes,
+                "")
+        else:
+            if not attributes["lastRepeat"]:
+                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes)
             return handle_wrong_state(attributes);
 
     # "player move" intent with the main game logic
     elif intent_name == "PlayerMove":
-        if attributes['state'] == STATE_PLAYING:
+        if attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_ULTIMATE:
+            return handle_ultimate_move(intent, attributes)
+        elif attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_CUBE:
+            return handle_cube_move(intent, attributes)
+        elif attributes['state'] == STATE_PLAYING:
 
             # get player's move
             valid = False
             move = ""
             if 'Move' in intent['slots'].keys() and 'value' in intent['slots']['Move'].keys():
                 move = intent['slots']['Move']['value'].upper()
-                if move in ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]:
+                if move in CLASSIC_FIELDS:
                     valid = True
 
             if not valid:
@@ -435,18 +949,22 @@ def on_intent(intent_request, session):
                 drawBoard(attributes["board"]))
         else:
             if not attributes["lastRepeat"]:
-                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes['state'])
+                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes)
             return handle_wrong_state(attributes);
 
     # check square intent
     elif intent_name == "CheckSquare":
-        if attributes['state'] == STATE_PLAYING:
+        if attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_ULTIMATE:
+            return handle_ultimate_check_square(intent, attributes)
+        elif attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_CUBE:
+            return handle_cube_check_square(intent, attributes)
+        elif attributes['state'] == STATE_PLAYING:
             # get player's move
             valid = False
             move = ""
             if 'Square' in intent['slots'].keys() and 'value' in intent['slots']['Square'].keys():
                 move = intent['slots']['Square']['value'].upper()
-                if move in ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]:
+                if move in CLASSIC_FIELDS:
                     valid = True
 
             if not valid:
@@ -476,12 +994,16 @@ def on_intent(intent_request, session):
                     False)
         else:
             if not attributes["lastRepeat"]:
-                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes['state'])            
+                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes)            
             return handle_wrong_state(attributes);
 
     # check board intent
     elif intent_name == "CheckBoard":
-        if attributes['state'] == STATE_PLAYING:
+        if attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_ULTIMATE:
+            return handle_ultimate_check_board(attributes)
+        elif attributes['state'] == STATE_PLAYING and attributes.get("mode") == MODE_CUBE:
+            return handle_cube_check_board(attributes)
+        elif attributes['state'] == STATE_PLAYING:
             content = sayBoard(attributes["board"])
             return say_message("Board Content",
                 content + ". <break time=\"1.0s\"/> " \
@@ -492,7 +1014,7 @@ def on_intent(intent_request, session):
                 False)
         else:
             if not attributes["lastRepeat"]:
-                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes['state'])
+                attributes["lastRepeat"]=set_wrong_state_reprompt(attributes)
             return handle_wrong_state(attributes);
 
     # "yes" intent
@@ -501,6 +1023,10 @@ def on_intent(intent_request, session):
             attributes['state'] = STATE_PLAYING
             # new game - clear board
             clearBoard(attributes)
+            if attributes.get("mode") == MODE_ULTIMATE:
+                return handle_ultimate_start(attributes, True)
+            elif attributes.get("mode") == MODE_CUBE:
+                return handle_cube_start(attributes, True)
             return say_message("Your move",
                 "You start. What is your first move?",
                 "What is your move? Say row followed by column, for example A1. ",
@@ -522,6 +1048,10 @@ def on_intent(intent_request, session):
 
             # new game - clear board
             clearBoard(attributes)
+            if attributes.get("mode") == MODE_ULTIMATE:
+                return handle_ultimate_start(attributes, False)
+            elif attributes.get("mode") == MODE_CUBE:
+                return handle_cube_start(attributes, False)
 
             # get computer's move
             computerMove = getAlexaMove(attributes);
@@ -545,10 +1075,13 @@ def on_intent(intent_request, session):
     elif intent_name == "AMAZON.HelpIntent":
         return handle_help_request(attributes)
 
-    elif intent_name == "AMAZON.StartOverIntent" or intent_name == "AMAZON.RepeatIntent":
+    elif intent_name == "AMAZON.StartOverIntent":
         initialise_attributes(attributes)
         return welcome_response(attributes)
 
+    elif intent_name == "AMAZON.RepeatIntent":
+        return handle_repeat_request(session, attributes)
+
     elif intent_name == "AMAZON.CancelIntent" or intent_name == "AMAZON.StopIntent":
         return handle_session_end_request()
 
@@ -561,13 +1094,14 @@ def on_session_ended(session_ended_request, session):
     Is not called when the skill returns should_end_session=true
     """
     #print("on_session_ended requestId=" + session_ended_request['requestId'] + ", sessionId=" + session['sessionId'])
-    # add cleanup logic here
+    expire_cached_responses(session['sessionId'])
 
 def initialise_attributes(attributes):
     attributes["state"] = STATE_SELECTING_DIFFICULTY
     attributes["player"] = 'X'
     attributes["computer"] = 'O'
     attributes["difficulty"] = "medium"
+    attributes["mode"] = MODE_CLASSIC
     attributes["board"] = [' '] * 10
     attributes["lastOutput"] = ""
     attributes["lastRepeat"] = ""
@@ -589,10 +1123,25 @@ def lambda_handler(event, context):
         on_session_started({'requestId': event['request']['requestId']},
                            event['session'])
 
+    # a retried request gets the response already sent, without playing the move again
+    requestKey = ('request', event['request']['requestId'])
+    response = get_cached_response(requestKey)
+    if response:
+        return response
+
     if event['request']['type'] == "LaunchRequest":
-        return on_launch(event['request'], event['session'])
+        response = on_launch(event['request'], event['session'])
+        cache_response([requestKey, ('last', event['session']['sessionId'])], event['session']['sessionId'], response)
+        return response
     elif event['request']['type'] == "IntentRequest":
-        return on_intent(event['request'], event['session'])
+        # the same intent sent again in the same session and game state is a repeated request as well,
+        # the key has to be taken before on_intent changes the session attributes
+        intentKey = get_intent_cache_key(event['request'], event['session'])
+        response = get_cached_response(intentKey)
+        if not response:
+            response = on_intent(event['request'], event['session'])
+        cache_response([requestKey, intentKey, ('last', event['session']['sessionId'])], event['session']['sessionId'], response)
+        return response
     elif event['request']['type'] == "SessionEndedRequest":
         return on_session_ended(event['request'], event['session'])                         
 
@@ -626,7 +1175,12 @@ def sayBoard(board):
     return b
 
 def clearBoard(attributes):
-    attributes["board"] = [' '] * 10
+    if attributes.get("mode") == MODE_ULTIMATE:
+        clearUltimateBoard(attributes)
+    elif attributes.get("mode") == MODE_CUBE:
+        attributes["board"] = [' '] * 65
+    else:
+        attributes["board"] = [' '] * 10
 
 def convertLetterToWord(l):
     if l=='X':
@@ -637,21 +1191,18 @@ def convertLetterToWord(l):
         return "free"
 
 def convertFieldToBoardNumber(f):
-    fields = ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]
-    return (fields.index(f) + 1)
+    return (CLASSIC_FIELDS.index(f) + 1)
 
 def convertBoardNumberToField(n):
-    fields = ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]
-    return fields[n-1]
+    return CLASSIC_FIELDS[n-1]
 
 def makeMove(board, letter, index):
     board[index] = letter
 
 def isWinner(b, l):
     # check if letter l won, i.e. has 3 in any possible combinations accross the board b
-    winning_lines = [[7,8,9], [4,5,6], [1,2,3], [7,4,1], [8,5,2], [9,6,3], [7,5,3], [9,5,1]]
-    for i in range(len(winning_lines)):
-        if (b[winning_lines[i][0]] == l and b[winning_lines[i][1]] == l and b[winning_lines[i][2]] == l):
+    for i in range(len(WINNING_LINES)):
+        if (b[WINNING_LINES[i][0]] == l and b[WINNING_LINES[i][1]] == l and b[WINNING_LINES[i][2]] == l):
             return True
     return False
 
@@ -711,30 +1262,457 @@ def getComputerMove(board, computerLetter):
             if isWinner(copy, playerLetter):
                 return i
 
-    # Try to take one of the corners, if they are free.
-    move = chooseRandomMoveFromList(board, [1, 3, 7, 9])
-    if move != None:
-        return move
-
-    # Try to take the center, if it is free.
-    if isSpaceFree(board, 5):
-        return 5
-
-    # Move on one of the sides.
-    return chooseRandomMoveFromList(board, [2, 4, 6, 8])
+    # Try to take one of the preferred squares, by default the corners, then the center and then the sides.
+    for squares in COMPUTER_MOVE_PREFERENCES:
+        move = chooseRandomMoveFromList(board, squares)
+        if move != None:
+            return move
 
 def getAlexaMove(attributes):
-    if (attributes["difficulty"] == "hard"):
+    # the difficulty sets the % chance that the computer makes a random move
+    chance = randint(1, 100)
+    if (chance <= RANDOM_MOVE_CHANCE[attributes["difficulty"]]):
+        move = chooseRandomMoveFromList(attributes["board"], [1,2,3,4,5,6,7,8,9])
+    else:
         move = getComputerMove(attributes["board"], attributes["computer"])
-    elif (attributes["difficulty"] == "medium"):
-        # medioum difficuly means that the computer has a certain % chance to make a random move
-        chance = randint(0, 100)
-        #print(chance)
-        if (chance > 60):
-            move = chooseRandomMoveFromList(attributes["board"], [1,2,3,4,5,6,7,8,9])
+    return move
+
+
+#---------------------------------------------------------------------------------------
+# -------------------------------- Ultimate mode ---------------------------------------
+#---------------------------------------------------------------------------------------
+# The ultimate board is a list of 9 sub-boards (index 0 unused), each of them a regular board.
+# macroBoard keeps the status of every sub-board: the letter which won it, 'D' for a draw or ' ' if still open.
+# nextBoard is the sub-board the next move has to be made on, or 0 if any open sub-board can be used.
+
+class SearchTimeout(Exception):
+    # raised when the search runs out of time
+    pass
+
+# evaluations of sub-boards keyed by their content, kept for as long as the lambda container lives
+ultimateSubBoardCache = {}
+
+def clearUltimateBoard(attributes):
+    attributes["board"] = [[]] + [[' '] * 10 for i in range(9)]
+    attributes["macroBoard"] = [' '] * 10
+    attributes["nextBoard"] = 0
+
+def drawUltimateBoard(board):
+    # This function prints out the ultimate board, sub-boards separated by lines.
+    boardPic = ""
+    for row in range(9):
+        if row in [3, 6]:
+            boardPic += "---+---+---\n"
+        line = ""
+        for col in range(9):
+            if col in [3, 6]:
+                line += "|"
+            mark = board[(row // 3) * 3 + col // 3 + 1][(row % 3) * 3 + col % 3 + 1]
+            if mark == " ":
+                mark = "~"
+            line += mark
+        boardPic += line + "\n"
+    return boardPic
+
+def sayUltimateBoard(board, macroBoard, nextBoard):
+    # This function says which sub-boards are finished and what is on the board to be played next.
+    b = ""
+    for i in range(1, 10):
+        if macroBoard[i] == 'D':
+            b += "Board " + convertBoardNumberToField(i) + " is a draw. "
+        elif macroBoard[i] != ' ':
+            b += "Board " + convertBoardNumberToField(i) + " is won by " + ("crosses" if macroBoard[i] == 'X' else "noughts") + ". "
+    if not b:
+        b = "No board is finished yet. "
+    if nextBoard:
+        b += "On board " + convertBoardNumberToField(nextBoard) + ": " + sayBoard(board[nextBoard])
+    return b
+
+def convertUltimateMoveToField(move):
+    return "square " + convertBoardNumberToField(move[1]) + " of board " + convertBoardNumberToField(move[0])
+
+def evaluateSubBoard(board):
+    # Return (status, score) of a sub-board. The status is the same as in macroBoard and the score
+    # tells how promising the sub-board is for X (positive) or O (negative), between -1 and 1.
+    key = ''.join(board[1:])
+    result = ultimateSubBoardCache.get(key)
+    if result is None:
+        if isWinner(board, 'X'):
+            result = ('X', 1.0)
+        elif isWinner(board, 'O'):
+            result = ('O', -1.0)
+        elif isBoardFull(board):
+            result = ('D', 0.0)
         else:
-            move = getComputerMove(attributes["board"], attributes["computer"])
+            score = 0
+            for line in WINNING_LINES:
+                marks = [board[i] for i in line]
+                if 'O' not in marks:
+                    score += marks.count('X') ** 2
+                if 'X' not in marks:
+                    score -= marks.count('O') ** 2
+            result = (' ', max(-0.9, min(0.9, score / 12.0)))
+        ultimateSubBoardCache[key] = result
+    return result
+
+def getUltimateMoves(board, macroBoard, nextBoard):
+    # Return all legal (sub-board, square) moves.
+    if nextBoard and macroBoard[nextBoard] == ' ':
+        boards = [nextBoard]
     else:
-        move = chooseRandomMoveFromList(attributes["board"], [1,2,3,4,5,6,7,8,9])
+        boards = [i for i in range(1, 10) if macroBoard[i] == ' ']
+    moves = []
+    for b in boards:
+        subBoard = board[b]
+        for s in range(1, 10):
+            if subBoard[s] == ' ':
+                moves.append((b, s))
+    return moves
+
+def makeUltimateMove(board, macroBoard, letter, move):
+    # Place the letter, update the status of the sub-board it was placed on
+    # and return the sub-board the opponent has to play on next.
+    board[move[0]][move[1]] = letter
+    macroBoard[move[0]] = evaluateSubBoard(board[move[0]])[0]
+    if macroBoard[move[1]] == ' ':
+        return move[1]
+    return 0
+
+def undoUltimateMove(board, macroBoard, move):
+    # moves can only be made on open sub-boards, so the sub-board is open again once the move is taken back
+    board[move[0]][move[1]] = ' '
+    macroBoard[move[0]] = ' '
+
+def getUltimateWinner(macroBoard):
+    # Return the winning letter, 'D' for a draw or ' ' if the game is not finished yet.
+    for l in ['X', 'O']:
+        if isWinner(macroBoard, l):
+            return l
+    if ' ' not in macroBoard[1:]:
+        return 'D'
+    return ' '
+
+def evaluateUltimateBoard(board, macroBoard):
+    # Return the score of an unfinished game for X (positive) or O (negative).
+    values = [0.0] * 10
+    for i in range(1, 10):
+        values[i] = evaluateSubBoard(board[i])[1]
+    score = sum(values) + values[5] * 0.5
+    for line in WINNING_LINES:
+        statuses = [macroBoard[i] for i in line]
+        if 'O' not in statuses and 'D' not in statuses:
+            score += sum([max(values[i], 0) for i in line]) ** 2
+        if 'X' not in statuses and 'D' not in statuses:
+            score -= sum([max(-values[i], 0) for i in line]) ** 2
+    return score
+
+def ultimateNegamax(board, macroBoard, nextBoard, letter, depth, alpha, beta, deadline):
+    # Return the score of the position for the letter to move, searching depth moves ahead.
+    if time.time() > deadline:
+        raise SearchTimeout()
+    if depth == 0:
+        if letter == 'X':
+            return evaluateUltimateBoard(board, macroBoard)
+        return -evaluateUltimateBoard(board, macroBoard)
+
+    otherLetter = 'O' if letter == 'X' else 'X'
+    best = -ULTIMATE_WIN_SCORE * 2
+    for move in getUltimateMoves(board, macroBoard, nextBoard):
+        following = makeUltimateMove(board, macroBoard, letter, move)
+        if macroBoard[move[0]] == letter and isWinner(macroBoard, letter):
+            # prefer quicker wins
+            score = ULTIMATE_WIN_SCORE + depth
+        elif ' ' not in macroBoard[1:]:
+            score = 0
+        else:
+            score = -ultimateNegamax(board, macroBoard, following, otherLetter, depth - 1, -beta, -alpha, deadline)
+        undoUltimateMove(board, macroBoard, move)
+        if score > best:
+            best = score
+        if best > alpha:
+            alpha = best
+        if alpha >= beta:
+            break
+    return best
+
+def getUltimateComputerMove(board, macroBoard, nextBoard, computerLetter, timeLimit=ULTIMATE_TIME_LIMIT):
+    # Search deeper and deeper until the time is up and return the best move of the deepest finished search.
+    deadline = time.time() + timeLimit
+    board = getBoardCopy(board)
+    macroBoard = list(macroBoard)
+    playerLetter = 'O' if computerLetter == 'X' else 'X'
+
+    moves = getUltimateMoves(board, macroBoard, nextBoard)
+    shuffle(moves)
+    bestMove = moves[0]
+    try:
+        for depth in range(1, 82):
+            alpha = -ULTIMATE_WIN_SCORE * 2
+            depthBest = None
+            for move in moves:
+                following = makeUltimateMove(board, macroBoard, computerLetter, move)
+                if macroBoard[move[0]] == computerLetter and isWinner(macroBoard, computerLetter):
+                    return move
+                elif ' ' not in macroBoard[1:]:
+                    score = 0
+                else:
+                    score = -ultimateNegamax(board, macroBoard, following, playerLetter, depth - 1, -ULTIMATE_WIN_SCORE * 2, -alpha, deadline)
+                undoUltimateMove(board, macroBoard, move)
+                if score > alpha:
+                    alpha = score
+                    depthBest = move
+            bestMove = depthBest
+            # search the best move first at the next depth, so that it is cut off sooner
+            moves.remove(bestMove)
+            moves.insert(0, bestMove)
+            if alpha >= ULTIMATE_WIN_SCORE or alpha <= -ULTIMATE_WIN_SCORE:
+                break
+    except SearchTimeout:
+        pass
+    return bestMove
+
+def getAlexaUltimateMove(attributes):
+    args = (attributes["board"], attributes["macroBoard"], attributes["nextBoard"])
+    # the difficulty sets the % chance that the computer makes a random move
+    chance = randint(1, 100)
+    if (chance <= LARGE_BOARD_RANDOM_MOVE_CHANCE[attributes["difficulty"]]):
+        move = choice(getUltimateMoves(*args))
+    else:
+        move = getUltimateComputerMove(*args, computerLetter=attributes["computer"])
     return move
 
+#---------------------------------------------------------------------------------------
+# -------------------------------- Cube mode -------------------------------------------
+#---------------------------------------------------------------------------------------
+# The cube board is a 1-based list of 64 squares (index 0 unused), level by level, each level row by row.
+
+def generateCubeLines():
+    # Return all 76 lines of 4 in the cube as lists of board numbers.
+    lines = []
+    directions = []
+    for dl in [-1, 0, 1]:
+        for dr in [-1, 0, 1]:
+            for dc in [-1, 0, 1]:
+                # only one of the two opposite directions of every line
+                if (dl, dr, dc) > (0, 0, 0):
+                    directions.append((dl, dr, dc))
+    for dl, dr, dc in directions:
+        for l in range(4):
+            for r in range(4):
+                for c in range(4):
+                    end = (l + 3 * dl, r + 3 * dr, c + 3 * dc)
+                    start = (l - dl, r - dr, c - dc)
+                    # count every line once, from its first square only
+                    if min(end) < 0 or max(end) > 3 or (min(start) >= 0 and max(start) <= 3):
+                        continue
+                    lines.append([(l + i * dl) * 16 + (r + i * dr) * 4 + (c + i * dc) + 1 for i in range(4)])
+    return lines
+
+CUBE_LINES = generateCubeLines()
+
+# for every square the indexes of the lines going through it, so that a move only looks at its own lines
+CUBE_SQUARE_LINES = [[] for i in range(65)]
+for i in range(len(CUBE_LINES)):
+    for square in CUBE_LINES[i]:
+        CUBE_SQUARE_LINES[square].append(i)
+
+# results of the forced win search keyed by position, kept for as long as the lambda container lives
+cubeSearchCache = {}
+
+def drawCubeBoard(board):
+    # This function prints out the cube, levels side by side.
+    boardPic = "L1   L2   L3   L4\n"
+    for r in range(4):
+        rows = []
+        for l in range(4):
+            row = ""
+            for c in range(4):
+                mark = board[l * 16 + r * 4 + c + 1]
+                if mark == " ":
+                    mark = "~"
+                row += mark
+            rows.append(row)
+        boardPic += " ".join(rows) + "\n"
+    return boardPic
+
+def sayCubeBoard(board):
+    # This function says where the crosses and the noughts are, the cube is too big to say all squares.
+    b = ""
+    for l, name in [('X', "Crosses"), ('O', "Noughts")]:
+        squares = [convertCubeNumberToField(i) for i in range(1, 65) if board[i] == l]
+        if squares:
+            b += name + " are in " + ", ".join(squares) + ". "
+    if not b:
+        b = "The cube is empty. "
+    return b
+
+def convertCubeFieldToBoardNumber(f, level):
+    return (level - 1) * 16 + CUBE_FIELDS.index(f) + 1
+
+def convertCubeNumberToField(n):
+    return CUBE_FIELDS[(n - 1) % 16] + " on level " + str((n - 1) // 16 + 1)
+
+def isCubeWinner(board, letter, move):
+    # check if letter won with the move, only the lines going through it can have changed
+    for i in CUBE_SQUARE_LINES[move]:
+        line = CUBE_LINES[i]
+        if board[line[0]] == letter and board[line[1]] == letter and board[line[2]] == letter and board[line[3]] == letter:
+            return True
+    return False
+
+def getCubeLineCounts(board):
+    # Return the number of crosses and noughts in every line, updated by makeCubeMove and undoCubeMove.
+    counts = {'X': [0] * len(CUBE_LINES), 'O': [0] * len(CUBE_LINES)}
+    for i in range(len(CUBE_LINES)):
+        for square in CUBE_LINES[i]:
+            if board[square] != ' ':
+                counts[board[square]][i] += 1
+    return counts
+
+def makeCubeMove(board, counts, letter, move):
+    board[move] = letter
+    letterCounts = counts[letter]
+    for i in CUBE_SQUARE_LINES[move]:
+        letterCounts[i] += 1
+
+def undoCubeMove(board, counts, move):
+    letterCounts = counts[board[move]]
+    for i in CUBE_SQUARE_LINES[move]:
+        letterCounts[i] -= 1
+    board[move] = ' '
+
+def getCubeThreats(board, counts, letter, lines):
+    # Return the squares on which letter would complete one of the given lines.
+    otherCounts = counts['O' if letter == 'X' else 'X']
+    letterCounts = counts[letter]
+    threats = set()
+    for i in lines:
+        if letterCounts[i] == 3 and otherCounts[i] == 0:
+            for square in CUBE_LINES[i]:
+                if board[square] == ' ':
+                    threats.add(square)
+    return threats
+
+def getCubeThreatMoves(board, counts, letter):
+    # Return the squares which make a new threat for letter, the ones making the most threats first.
+    otherCounts = counts['O' if letter == 'X' else 'X']
+    letterCounts = counts[letter]
+    moves = {}
+    for i in range(len(CUBE_LINES)):
+        if letterCounts[i] == 2 and otherCounts[i] == 0:
+            for square in CUBE_LINES[i]:
+                if board[square] == ' ':
+                    moves[square] = moves.get(square, 0) + 1
+    return sorted(moves, key=lambda square: -moves[square])
+
+def findCubeForcedWin(board, counts, letter, opponentThreats, depth, deadline):
+    # Threat space search: return a move starting a sequence of threats which the opponent has to answer
+    # and which ends with two threats at once, or None if there is no such sequence within depth moves.
+    # opponentThreats are the squares on which the opponent would win straight away.
+    if time.time() > deadline:
+        raise SearchTimeout()
+    if len(opponentThreats) > 1 or depth == 0:
+        return None
+
+    key = ''.join(board[1:]) + letter + str(depth)
+    if key in cubeSearchCache:
+        return cubeSearchCache[key]
+
+    otherLetter = 'O' if letter == 'X' else 'X'
+    result = None
+    for move in getCubeThreatMoves(board, counts, letter):
+        # a pending threat of the opponent has to be blocked first
+        if opponentThreats and move not in opponentThreats:
+            continue
+        # moves are taken back even when the search runs out of time, the board is used after it
+        makeCubeMove(board, counts, letter, move)
+        try:
+            threats = getCubeThreats(board, counts, letter, CUBE_SQUARE_LINES[move])
+            if len(threats) > 1:
+                result = move
+            elif len(threats) == 1:
+                # the opponent is forced to block the only threat
+                block = threats.pop()
+                makeCubeMove(board, counts, otherLetter, block)
+                try:
+                    if findCubeForcedWin(board, counts, letter, getCubeThreats(board, counts, otherLetter, CUBE_SQUARE_LINES[block]), depth - 1, deadline):
+                        result = move
+                finally:
+                    undoCubeMove(board, counts, block)
+        finally:
+            undoCubeMove(board, counts, move)
+        if result:
+            break
+
+    if len(cubeSearchCache) >= CUBE_CACHE_SIZE:
+        cubeSearchCache.clear()
+    cubeSearchCache[key] = result
+    return result
+
+def getCubeHeuristicMove(board, counts, computerLetter):
+    # Return the square on the most lines still open for the computer or worth blocking for the player.
+    playerLetter = 'O' if computerLetter == 'X' else 'X'
+    bestScore = -1
+    bestMoves = []
+    for square in range(1, 65):
+        if board[square] != ' ':
+            continue
+        score = 0
+        for i in CUBE_SQUARE_LINES[square]:
+            if counts[playerLetter][i] == 0:
+                score += 4 ** counts[computerLetter][i]
+            if counts[computerLetter][i] == 0:
+                score += 3 ** counts[playerLetter][i]
+        if score > bestScore:
+            bestScore = score
+            bestMoves = [square]
+        elif score == bestScore:
+            bestMoves.append(square)
+    return choice(bestMoves)
+
+def getCubeComputerMove(board, computerLetter, timeLimit=CUBE_TIME_LIMIT):
+    # Given a cube and the computer's letter, determine where to move and return that move.
+    deadline = time.time() + timeLimit
+    playerLetter = 'O' if computerLetter == 'X' else 'X'
+    board = list(board)
+    counts = getCubeLineCounts(board)
+    allLines = range(len(CUBE_LINES))
+
+    # First, check if we can win in the next move
+    threats = getCubeThreats(board, counts, computerLetter, allLines)
+    if threats:
+        return threats.pop()
+
+    # Check if the player could win on their next move, and block them.
+    playerThreats = getCubeThreats(board, counts, playerLetter, allLines)
+    if len(playerThreats) > 1:
+        return playerThreats.pop()
+
+    try:
+        # Look for a forced win, searching deeper while there is time left
+        for depth in range(1, CUBE_MAX_THREAT_DEPTH + 1):
+            move = findCubeForcedWin(board, counts, computerLetter, playerThreats, depth, deadline)
+            if move:
+                return move
+        if playerThreats:
+            return playerThreats.pop()
+
+        # Take away the first move of the player's forced win, if there is one
+        for depth in range(1, CUBE_MAX_THREAT_DEPTH + 1):
+            move = findCubeForcedWin(board, counts, playerLetter, set(), depth, deadline)
+            if move:
+                return move
+    except SearchTimeout:
+        if playerThreats:
+            return playerThreats.pop()
+
+    return getCubeHeuristicMove(board, counts, computerLetter)
+
+def getAlexaCubeMove(attributes):
+    # the difficulty sets the % chance that the computer makes a random move
+    chance = randint(1, 100)
+    if (chance <= LARGE_BOARD_RANDOM_MOVE_CHANCE[attributes["difficulty"]]):
+        move = choice([i for i in range(1, 65) if isSpaceFree(attributes["board"], i)])
+    else:
+        move = getCubeComputerMove(attributes["board"], attributes["computer"])
+    return move
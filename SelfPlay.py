@@ -0,0 +1,187 @@
+"""
+Self-play environment for tuning the difficulty levels of the Noughts and Crosses skill.
+
+Many games are played in lock-step: every step makes one move in each unfinished game.
+Boards are kept as bit masks of the crosses and noughts (bit 0 is square 1), so that wins
+and free squares are looked up in precomputed tables instead of checking the lines every time.
+
+The parameter sweep plays the computer, with every random move chance and move preference
+order, against a model of a human player who plays the computer's best move but makes a
+random one with a given chance. The human model and the candidate orders do not depend on the
+current settings of the skill, so pasting the results in does not change the next sweep. It then picks the values of RANDOM_MOVE_CHANCE and
+COMPUTER_MOVE_PREFERENCES in NoughtsAndCrosses.py which bring the human win rate of every
+difficulty closest to its target. Every candidate gets its own seed, so the results do
+not depend on the number of worker processes.
+
+Usage:
+    python SelfPlay.py --games 2000 --seed 1 --workers 4 --easy 0.6 --medium 0.3 --hard 0.05
+"""
+
+from __future__ import print_function
+from itertools import permutations
+from multiprocessing import Pool
+import argparse
+import random
+
+import NoughtsAndCrosses
+
+EMPTY = 0
+CROSS = 1
+NOUGHT = 2
+
+LINE_MASKS = [sum(1 << (i - 1) for i in line) for line in NoughtsAndCrosses.WINNING_LINES]
+FULL_MASK = (1 << 9) - 1
+
+# the groups of squares the candidate move preference orders are made of
+SQUARE_GROUPS = [[1, 3, 7, 9], [5], [2, 4, 6, 8]]
+# the move preferences of the modelled human: corners, then the center and then the sides
+HUMAN_MOVE_PREFERENCES = [[1, 3, 7, 9], [5], [2, 4, 6, 8]]
+
+# for every mask of one letter, whether it contains a whole line
+WIN_TABLE = [any(mask & line == line for line in LINE_MASKS) for mask in range(1 << 9)]
+# for every mask of occupied squares, the list of free squares
+FREE_SQUARES = [[i for i in range(1, 10) if not occupied & (1 << (i - 1))] for occupied in range(1 << 9)]
+
+
+class SelfPlayEnvironment(object):
+    """ A batch of games played in lock-step, crosses moving first in every game """
+
+    def __init__(self, numGames):
+        self.numGames = numGames
+        self.reset()
+
+    def reset(self):
+        self.masks = {CROSS: [0] * self.numGames, NOUGHT: [0] * self.numGames}
+        self.toMove = CROSS
+        self.winners = [EMPTY] * self.numGames
+        self.done = [False] * self.numGames
+        return self.masks
+
+    def freeSquares(self, game):
+        return FREE_SQUARES[self.masks[CROSS][game] | self.masks[NOUGHT][game]]
+
+    def step(self, moves):
+        # make one move (a square from 1 to 9, None for finished games) in every game
+        letterMasks = self.masks[self.toMove]
+        otherMasks = self.masks[NOUGHT if self.toMove == CROSS else CROSS]
+        for game in range(self.numGames):
+            if self.done[game]:
+                continue
+            letterMasks[game] |= 1 << (moves[game] - 1)
+            if WIN_TABLE[letterMasks[game]]:
+                self.winners[game] = self.toMove
+                self.done[game] = True
+            elif letterMasks[game] | otherMasks[game] == FULL_MASK:
+                self.done[game] = True
+        self.toMove = NOUGHT if self.toMove == CROSS else CROSS
+        return self.winners, self.done
+
+    def allDone(self):
+        return all(self.done)
+
+
+# ------------------------------- Policies -----------------------------------------------
+# A policy returns the move of the letter to move for one game, or None for finished games.
+
+def randomPolicy(env, game, rng):
+    return rng.choice(env.freeSquares(game))
+
+def makeComputerPolicy(preferences):
+    # the same moves as getComputerMove in the skill
+    def computerPolicy(env, game, rng):
+        letterMask = env.masks[env.toMove][game]
+        otherMask = env.masks[NOUGHT if env.toMove == CROSS else CROSS][game]
+        free = env.freeSquares(game)
+        for mask in [letterMask, otherMask]:
+            for i in free:
+                if WIN_TABLE[mask | (1 << (i - 1))]:
+                    return i
+        for squares in preferences:
+            possibleMoves = [i for i in squares if i in free]
+            if possibleMoves:
+                return rng.choice(possibleMoves)
+    return computerPolicy
+
+def makeMixedPolicy(policy, randomChance):
+    # plays a random move with randomChance % chance, like getAlexaMove in the skill
+    def mixedPolicy(env, game, rng):
+        if rng.randint(1, 100) <= randomChance:
+            return randomPolicy(env, game, rng)
+        return policy(env, game, rng)
+    return mixedPolicy
+
+def playGames(numGames, firstPolicy, secondPolicy, rng):
+    # play numGames games, firstPolicy playing crosses, and return the numbers of wins for crosses, noughts and draws
+    env = SelfPlayEnvironment(numGames)
+    while not env.allDone():
+        policy = firstPolicy if env.toMove == CROSS else secondPolicy
+        env.step([None if env.done[game] else policy(env, game, rng) for game in range(numGames)])
+    return env.winners.count(CROSS), env.winners.count(NOUGHT), env.winners.count(EMPTY)
+
+
+# ------------------------------- Parameter sweep ----------------------------------------
+
+def humanWinRate(task):
+    # human win rate against the computer with the given parameters, half of the games started by the human
+    randomChance, preferences, humanMistakes, numGames, seed = task
+    rng = random.Random(seed)
+    computer = makeMixedPolicy(makeComputerPolicy(preferences), randomChance)
+    human = makeMixedPolicy(makeComputerPolicy(HUMAN_MOVE_PREFERENCES), humanMistakes)
+    humanFirst = playGames(numGames // 2, human, computer, rng)[0]
+    humanSecond = playGames(numGames - numGames // 2, computer, human, rng)[1]
+    return float(humanFirst + humanSecond) / numGames
+
+def sweep(targets, numGames=2000, seed=1, workers=1, humanMistakes=30, chanceStep=5):
+    # Return (randomChances, preferences, winRates) closest to the target human win rate of every difficulty.
+    chances = list(range(0, 101, chanceStep))
+    orders = [[list(group) for group in order] for order in permutations(SQUARE_GROUPS)]
+    tasks = []
+    for o in range(len(orders)):
+        for c in range(len(chances)):
+            tasks.append((chances[c], orders[o], humanMistakes, numGames, seed * 1000003 + o * len(chances) + c))
+
+    if workers > 1:
+        pool = Pool(workers)
+        rates = pool.map(humanWinRate, tasks)
+        pool.close()
+        pool.join()
+    else:
+        rates = [humanWinRate(task) for task in tasks]
+
+    # the move preferences are shared by all difficulties, so pick the order fitting all targets best
+    best = None
+    for o in range(len(orders)):
+        orderRates = rates[o * len(chances):(o + 1) * len(chances)]
+        randomChances = {}
+        winRates = {}
+        error = 0
+        for difficulty in targets:
+            c = min(range(len(chances)), key=lambda c: abs(orderRates[c] - targets[difficulty]))
+            randomChances[difficulty] = chances[c]
+            winRates[difficulty] = orderRates[c]
+            error += (orderRates[c] - targets[difficulty]) ** 2
+        if best is None or error < best[0]:
+            best = (error, randomChances, orders[o], winRates)
+    return best[1], best[2], best[3]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the difficulty levels to target human win rates by self-play.")
+    parser.add_argument("--games", type=int, default=2000, help="games played for every candidate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="number of processes")
+    parser.add_argument("--human-mistakes", type=int, default=30, help="chance (in %%) that the modelled human plays a random move")
+    parser.add_argument("--step", type=int, default=5, help="step of the random move chances tried (in %%)")
+    parser.add_argument("--easy", type=float, default=0.6, help="target human win rate on easy")
+    parser.add_argument("--medium", type=float, default=0.3, help="target human win rate on medium")
+    parser.add_argument("--hard", type=float, default=0.05, help="target human win rate on hard")
+    args = parser.parse_args()
+
+    targets = {"easy": args.easy, "medium": args.medium, "hard": args.hard}
+    randomChances, preferences, winRates = sweep(targets, args.games, args.seed, args.workers, args.human_mistakes, args.step)
+    for difficulty in ["easy", "medium", "hard"]:
+        print("%-6s random move chance %3d%%, human win rate %.3f (target %.3f)" % (difficulty, randomChances[difficulty], winRates[difficulty], targets[difficulty]))
+    print("RANDOM_MOVE_CHANCE = {\"easy\": %d, \"medium\": %d, \"hard\": %d}" % (randomChances["easy"], randomChances["medium"], randomChances["hard"]))
+    print("COMPUTER_MOVE_PREFERENCES = " + str(preferences))
+
+if __name__ == "__main__":
+    main()